@@ -1,8 +1,12 @@
+import asyncio
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
 import os
-from handlers.message_handler import handle_message
-from handlers import setup_logging
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, filters
 from handlers.message_handler import handle_message, handle_whitelist_command, handle_whitelist_group_command
 from handlers.criteria_handler import handle_criteria_check
@@ -15,95 +19,193 @@ TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 WHITELIST_USER_COMMAND=os.getenv("WHITELIST_USER_COMMAND")
 WHITELIST_GROUP_COMMAND=os.getenv("WHITELIST_GROUP_COMMAND")
 
+class FastRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that tracks bytes written itself instead of
+    stat()-ing the log file on every emit to decide whether to roll over.
+    """
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        try:
+            self._bytes_written = os.path.getsize(self.baseFilename)
+        except OSError:
+            self._bytes_written = 0
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        msg = self.format(record)
+        # Count encoded bytes, not characters: Telegram traffic is full of
+        # emoji and non-ASCII text, so len(msg) would undercount what the
+        # stream writes and let the file overshoot maxBytes.
+        encoding = getattr(self.stream, "encoding", None) or "utf-8"
+        self._bytes_written += len(msg.encode(encoding, errors="replace")) + 1
+        return self._bytes_written >= self.maxBytes
+
+    def doRollover(self):
+        super().doRollover()
+        self._bytes_written = 0
+
+class _NameFilter(logging.Filter):
+    """Accept only records emitted by one of the given logger names."""
+    def __init__(self, *names):
+        super().__init__()
+        self._names = names
+
+    def filter(self, record):
+        return record.name in self._names
+
 class BotLogger:
+    _QUIET_LOGGERS = ("urllib3", "httpx", "httpcore", "openai", "telegram", "telegram.ext", "asyncio")
+
     def __init__(self, log_dir="logs"):
+        # Skip the getframe/stack walk and pid/thread/process-name lookups
+        # LogRecord performs per record; none of that reaches our format
+        # string. Also never raise from inside handlers.
+        logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+        logging._srcfile = None
+        logging.raiseExceptions = False
+
         self.log_dir = log_dir
         os.makedirs(log_dir, exist_ok=True)
-        
+
         # Set up file handlers
         self.setup_file_handlers()
-        
-        # Configure root logger
+
+        # Configure root logger; file writes go through the queue so the
+        # emitting thread never touches disk.
         logging.basicConfig(
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             level=logging.INFO,
-            handlers=[self.console_handler]
+            handlers=[self.queue_handler, self.console_handler]
         )
-        
+
+        # Quiet the chatty HTTP/client libraries: their per-request INFO
+        # records would otherwise be formatted and queued on every outbound
+        # LLM/Perplexity/Telegram call.
+        for name in self._QUIET_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
         # Get logger instance
         self.logger = logging.getLogger(__name__)
-        
+
     def setup_file_handlers(self):
         # Console handler
         self.console_handler = logging.StreamHandler()
         self.console_handler.setLevel(logging.INFO)
-        
+
         # Message log handler (10MB max size, 5 backup files)
-        message_handler = RotatingFileHandler(
+        message_handler = FastRotatingFileHandler(
             os.path.join(self.log_dir, 'messages.log'),
             maxBytes=10*1024*1024,
             backupCount=5
         )
         message_handler.setLevel(logging.INFO)
-        
-        # Event log handler
-        event_handler = RotatingFileHandler(
+
+        # Event log handler (also receives the art/criteria loggers)
+        event_handler = FastRotatingFileHandler(
             os.path.join(self.log_dir, 'events.log'),
             maxBytes=10*1024*1024,
             backupCount=5
         )
         event_handler.setLevel(logging.INFO)
-        
+
         # Error log handler
-        error_handler = RotatingFileHandler(
+        error_handler = FastRotatingFileHandler(
             os.path.join(self.log_dir, 'errors.log'),
             maxBytes=10*1024*1024,
             backupCount=5
         )
         error_handler.setLevel(logging.ERROR)
-        
+
         # Create formatters
         formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            style='%', validate=False
         )
-        
+
         # Set formatters
         for handler in [message_handler, event_handler, error_handler, self.console_handler]:
             handler.setFormatter(formatter)
-        
-        # Store handlers
-        self.handlers = {
-            'message': message_handler,
-            'event': event_handler,
-            'error': error_handler
-        }
+
+        # Buffer the message/event handlers so the listener issues one batched
+        # write per ~512 records instead of a syscall per record. Errors flush
+        # immediately; a background timer flushes low-traffic logs every second.
+        buffered_message = MemoryHandler(
+            capacity=512, flushLevel=logging.ERROR,
+            target=message_handler, flushOnClose=True
+        )
+        buffered_message.addFilter(_NameFilter('message_logger'))
+        buffered_event = MemoryHandler(
+            capacity=512, flushLevel=logging.ERROR,
+            target=event_handler, flushOnClose=True
+        )
+        buffered_event.addFilter(_NameFilter('event_logger', 'art_logger', 'criteria_logger'))
+        self._buffered_handlers = [buffered_message, buffered_event]
+
+        # Publish every record to an in-memory queue; a QueueListener thread
+        # drains it and fans out to the file handlers, keeping file I/O and
+        # formatting off the asyncio event-loop thread.
+        self._log_queue = queue.Queue(-1)
+        self.queue_handler = QueueHandler(self._log_queue)
+        self._listener = QueueListener(
+            self._log_queue,
+            buffered_message, buffered_event, error_handler,
+            respect_handler_level=True
+        )
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(1)
+            for handler in self._buffered_handlers:
+                handler.flush()
+
+    def start(self):
+        """Start the background listener thread that writes the log files."""
+        self._listener.start()
+        threading.Thread(target=self._flush_loop, name="log-flush", daemon=True).start()
+        for handler in self._buffered_handlers:
+            atexit.register(handler.close)
+        atexit.register(self._listener.stop)
+
+async def _configure_executor(application):
+    """
+    Install a small named thread pool as the loop's default executor.
+    Everything dispatched via asyncio.to_thread / run_in_executor(None, ...)
+    is network-bound (LLM, Perplexity, DB), so eight workers cap outbound
+    concurrency without the default pool's min(32, cpu+4) thread stacks.
+    """
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+    )
 
 def main():
     # Initialize logger
     bot_logger = BotLogger()
+    bot_logger.start()
     logger = bot_logger.logger
 
     logger.info("Initializing bot application...")
 
     # Initialize bot with custom event logging
-    application = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
+    application = ApplicationBuilder().token(TELEGRAM_TOKEN).post_init(_configure_executor).build()
+
+    # Route the named loggers through the shared log queue
+    setup_logging.setup_logging(bot_logger.queue_handler)
 
-    # Set up logging handlers in message handler
-    setup_logging.setup_logging(bot_logger.handlers)
-    
     # Add the whitelist command handler for individual users.
     application.add_handler(CommandHandler(WHITELIST_USER_COMMAND, handle_whitelist_command))
-    
+
     # Add the new whitelist_group command handler.
     application.add_handler(CommandHandler(WHITELIST_GROUP_COMMAND, handle_whitelist_group_command))
-    
+
     application.add_handler(MessageHandler(filters.ALL, handle_message), group=1)
 
     # Add the criteria-check handler so it processes after handle_message.
     application.add_handler(MessageHandler(filters.ALL, handle_criteria_check), group=2)
-    
+
     logger.info("Bot initialized successfully. Starting polling...")
-    
+
     # Start the bot
     try:
         application.run_polling()
@@ -1,7 +1,8 @@
-import requests
+import asyncio
+import httpx
 import logging
 import base64
-import json
+import orjson
 from typing import Optional
 import os
 from dotenv import load_dotenv
@@ -9,58 +10,73 @@ from dotenv import load_dotenv
 # Initialize logger
 art_logger = logging.getLogger('art_logger')
 
+# load_dotenv must run before the getenv calls below, otherwise the key and
+# endpoint are None and every request would send "Bearer None".
+load_dotenv()
+
 HYPERBOLIC_API_KEY = os.getenv("HYPERBOLIC_API_KEY")
 ENDPOINT = os.getenv("HYPERBOLIC_ENDPOINT")
 ART_MODEL_NAME = os.getenv("ART_MODEL_NAME")
 
-load_dotenv()
+# Request constants built once at import instead of per call.
+_ART_URL = f"{ENDPOINT.rstrip('/')}/image/generation" if ENDPOINT else None
+_BASE_PAYLOAD = {
+    "model_name": ART_MODEL_NAME,
+    "steps": 30,
+    "cfg_scale": 5,
+    "enable_refiner": False,
+    "height": 1024,
+    "width": 1024,
+    "backend": "auto"
+}
+
+# One shared async client: the multi-second generation wait is cooperative
+# (no executor thread burned per request), HTTP/2 multiplexes concurrent
+# generations on a single keep-alive TLS connection.
+ART_CLIENT = httpx.AsyncClient(
+    http2=True,
+    timeout=httpx.Timeout(connect=5.0, read=180.0, write=10.0, pool=5.0),
+    headers={
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {HYPERBOLIC_API_KEY}"
+    }
+)
 
 
-def generate_art(prompt: str) -> Optional[bytes]:
+async def generate_art(prompt: str) -> Optional[bytes]:
     """
     Generate art using the Hyperbolic API.
-    
+
     Args:
         prompt (str): The prompt for art generation
-        
+
     Returns:
         Optional[bytes]: The generated image as bytes, or None if generation failed
     """
     print("Generating art...")
     try:
-        url = ENDPOINT + "image/generation"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {HYPERBOLIC_API_KEY}"
-        }
-        data = {
-            "model_name": ART_MODEL_NAME,
-            "prompt": prompt,
-            "steps": 30,
-            "cfg_scale": 5,
-            "enable_refiner": False,
-            "height": 1024,
-            "width": 1024,
-            "backend": "auto"
-        }
-        
         art_logger.info(f"Generating art with prompt: {prompt[:100]}...")
-        response = requests.post(url, headers=headers, json=data)
+        # Serialize with orjson (returns bytes) instead of httpx's stdlib
+        # json encoder; Content-Type is already set on the client.
+        body = orjson.dumps({**_BASE_PAYLOAD, "prompt": prompt})
+        response = await ART_CLIENT.post(_ART_URL, content=body)
         response.raise_for_status()
-        
-        result = response.json()
+
+        result = orjson.loads(response.content)
         if 'image' in result.get('images', [{}])[0]:
             # Get base64 image data
             image_data = result['images'][0]['image']
-            # Decode base64 to bytes
-            image_bytes = base64.b64decode(image_data)
+            # Decode base64 to bytes off the event loop — the payload is
+            # ~1-2 MB and the decode would otherwise block the loop;
+            # validate=False skips the per-character class scan
+            image_bytes = await asyncio.to_thread(base64.b64decode, image_data, validate=False)
             art_logger.info("Art generation successful")
             return image_bytes
         else:
             art_logger.error(f"No image data in response: {result}")
             return None
-            
+
     except Exception as e:
         e = str(e)[:1000]
         art_logger.error(f"Error generating art: {e}")
-        return None
\ No newline at end of file
+        return None
